@@ -6,4 +6,7 @@ This package contains the following modules:
     * parser: Module for parsing HTTP responses/requests
     * util: Module with utility functions
     * server: Module which contains a HTTP server
+    * prewarm: Module for pre-warming caches at startup
+    * profiler: Module for profiling a running server
+    * vhost: Module for resolving virtual hosts to document roots
 """
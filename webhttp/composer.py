@@ -8,6 +8,7 @@ import time
 
 import webhttp.message
 import webhttp.resource
+import webhttp.vhost
 
 accept_enc = {
     "gzip",
@@ -18,13 +19,19 @@ accept_enc = {
 class ResponseComposer:
     """Class that composes a HTTP response to a HTTP request"""
 
-    def __init__(self, timeout):
+    def __init__(self, timeout, vhosts=None, allow_put=False):
         """Initialize the ResponseComposer
         
         Args:
             timeout (int): connection timeout
+            vhosts (webhttp.vhost.VirtualHosts): virtual hosts to serve
+            allow_put (bool): allow clients to upload files with PUT
         """
         self.timeout = timeout
+        self.allow_put = allow_put
+        if vhosts is None:
+            vhosts = webhttp.vhost.VirtualHosts()
+        self.vhosts = vhosts
         self.persistent = True
     
     def compose_response(self, request):
@@ -40,9 +47,13 @@ class ResponseComposer:
         if request.get_header("Connection") != "keep-alive":
             self.persistent = False
         
-        if request.get_version() == "HTTP/1.1":
+        if request.get_version() == "HTTP/1.1" and request.method == "PUT":
+            response = self.compose_put(request)
+        elif request.get_version() == "HTTP/1.1":
             try:
-                resource = webhttp.resource.Resource(request.uri)
+                docroot = self.vhosts.resolve(request.get_header("Host"))
+                resource = webhttp.resource.Resource(request.uri, docroot)
+                docroot.record_hit(request.uri)
                 etag = resource.generate_etag()
                 if self.match_etag(etag, request):
                     response = self.compose_common()
@@ -56,15 +67,19 @@ class ResponseComposer:
                         response.set_header("ETag", etag)
                         response.set_header("Content-Type", resource.get_content_type())
                         resource.encode_content(prefencoding)
-                        response.set_header("Content-Length", resource.get_content_length())
-                        response.set_header("Content-Encoding", resource.get_content_encoding())
+                        # The file can change while it is read, the length
+                        # has to match the body that is sent
                         response.body = resource.get_content()
+                        response.set_header("Content-Length", len(response.body))
+                        response.set_header("Content-Encoding", resource.get_content_encoding())
                     else:
                         response = self.compose_error(406, True, False)
             except webhttp.resource.FileExistError:
                 response = self.compose_error(404, True, False)
             except webhttp.resource.FileAccessError:
                 response = self.compose_error(403, True, False)
+            except (IOError, OSError):
+                response = self.compose_error(500, True, False)
         else:
             response = self.compose_error(505, True, False)
             
@@ -73,6 +88,36 @@ class ResponseComposer:
 
         return response
     
+    def compose_put(self, request):
+        """Compose a response to a PUT request, storing its body
+        
+        Args:
+            request (webhttp.Request): request from client
+
+        Returns:
+            webhttp.Response: response to request
+        """
+        if not self.allow_put:
+            response = self.compose_error(405, True, False)
+            response.set_header("Allow", "GET")
+            return response
+        
+        docroot = self.vhosts.resolve(request.get_header("Host"))
+        try:
+            created = docroot.write(request.uri, request.body_file)
+        except webhttp.resource.FileAccessError:
+            return self.compose_error(403, True, False)
+        except (IOError, OSError):
+            return self.compose_error(500, True, False)
+        
+        response = self.compose_common()
+        if created:
+            response.code = 201
+            response.set_header("Content-Length", 0)
+        else:
+            response.code = 204
+        return response
+    
     def compose_common(self):
         response = webhttp.message.Response()
         response.set_header("Date", self.make_date_string())
@@ -6,12 +6,18 @@ This modules contains classes for representing HTTP responses and requests.
 reasondict = {
     # Dictionary for code reasons
     # Format: code : "Reason"
+    100 : "Continue",
     200 : "OK",
+    201 : "Created",
+    204 : "No Content",
     304 : "Not Modified",
+    400 : "Bad Request",
     403 : "Forbidden",
     404 : "Not Found",
+    405 : "Method Not Allowed",
     406 : "Not Acceptable",
     408 : "Request Time-out",
+    413 : "Request Entity Too Large",
     505 : "HTTP Version Not Supported (HTTP 1.1 required)",
     500 : "Internal Server Error"
 }
@@ -79,6 +85,7 @@ class Request(Message):
         super(Request, self).__init__()
         self.method = ""
         self.uri = ""
+        self.body_file = None
         
     def __str__(self):
         """Convert the Request to a string
@@ -3,19 +3,54 @@
 This module contains parses for HTTP response and HTTP requests.
 """
 
+import tempfile
+
 import webhttp.message
 
+# Request bodies larger than this are stored in a temporary file on disk
+spool_size = 64 * 1024
+
+# Maximum size of the request line and headers of a request
+max_header_size = 8 * 1024
+
+
+class RequestError(Exception):
+    """Exception which is raised when the request line or headers of a
+    request are malformed or too large
+    """
+    pass
+
+
+class BodyError(Exception):
+    """Exception which is raised when a request body is malformed or the
+    connection is closed while reading it
+    """
+    pass
+
+
+class BodyTooLargeError(Exception):
+    """Exception which is raised when a request body exceeds the size limit"""
+    pass
+
 
 class RequestParser:
     """Class that parses a HTTP request"""
 
-    def __init__(self):
-        """Initialize the RequestParser"""
-        pass
+    def __init__(self, max_body_size=None):
+        """Initialize the RequestParser
+
+        Args:
+            max_body_size (int): maximum size of a request body in bytes,
+                no limit if None
+        """
+        self.max_body_size = max_body_size
         
     def parse_requests(self, buff):
         """Parse requests in a buffer
 
+        Raises:
+            RequestError: if a request line is malformed
+
         Args:
             buff (str): the buffer contents received from socket
 
@@ -36,6 +71,8 @@ class RequestParser:
             """
             end_line = request.find('\r\n', 0)
             line_parts = request[0:end_line].split(' ')
+            if len(line_parts) != 3:
+                raise RequestError("malformed request line")
             http_request.method = line_parts[0]
             http_request.uri = line_parts[1]
             http_request.version = line_parts[2]
@@ -60,6 +97,168 @@ class RequestParser:
         
         return http_requests
 
+    def has_body(self, request):
+        """Check whether a request has a body
+
+        Args:
+            request (webhttp.Request): request with parsed headers
+
+        Returns:
+            bool: True if the request has a body
+        """
+        return (request.get_header("Transfer-Encoding") != "" or
+                request.get_header("Content-Length") not in ("", "0"))
+
+    def get_content_length(self, request):
+        """Get the length of the body of a request which is not chunked
+
+        Raises:
+            BodyError: if the Content-Length is invalid
+            BodyTooLargeError: if the body exceeds the size limit
+
+        Args:
+            request (webhttp.Request): request with parsed headers
+
+        Returns:
+            int: length of the body in bytes
+        """
+        length = request.get_header("Content-Length")
+        if not length.isdigit():
+            raise BodyError("invalid Content-Length")
+        length = int(length)
+        if self.max_body_size is not None and length > self.max_body_size:
+            raise BodyTooLargeError
+        return length
+
+    def parse_body(self, request, buff, recv):
+        """Read the body of a request into request.body_file
+
+        Small bodies are kept in memory, larger bodies are stored in a
+        temporary file.
+
+        Raises:
+            BodyError: if the body is malformed or the connection is closed
+            BodyTooLargeError: if the body exceeds the size limit
+
+        Args:
+            request (webhttp.Request): request with parsed headers
+            buff (str): data received after the headers of the request
+            recv (function): receives more data from the socket
+
+        Returns:
+            str: data received after the body, i.e. the next request
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        try:
+            encoding = request.get_header("Transfer-Encoding")
+            if encoding != "":
+                if encoding.lower() != "chunked":
+                    raise BodyError("unsupported Transfer-Encoding")
+                buff = self.read_chunked(body, buff, recv)
+            else:
+                length = self.get_content_length(request)
+                buff = self.read_exact(body, buff, length, recv)
+        except:
+            body.close()
+            raise
+        body.seek(0)
+        request.body_file = body
+        return buff
+
+    def read_exact(self, body, buff, length, recv):
+        """Read a number of bytes into the body
+
+        Args:
+            body (file): file to write the body to
+            buff (str): data that has already been received
+            length (int): number of bytes to read
+            recv (function): receives more data from the socket
+
+        Returns:
+            str: data received after the bytes that were read
+        """
+        while length > 0:
+            if buff == "":
+                buff = self.receive(recv)
+            part = buff[:length]
+            body.write(part)
+            length -= len(part)
+            buff = buff[len(part):]
+        return buff
+
+    def read_line(self, buff, recv):
+        """Read a line ending with CRLF
+
+        Args:
+            buff (str): data that has already been received
+            recv (function): receives more data from the socket
+
+        Returns:
+            (str, str): the line without CRLF and the data after it
+        """
+        end_line = buff.find('\r\n')
+        while end_line < 0:
+            if len(buff) > 4096:
+                raise BodyError("line too long")
+            buff += self.receive(recv)
+            end_line = buff.find('\r\n')
+        return (buff[:end_line], buff[end_line + 2:])
+
+    def read_chunked(self, body, buff, recv):
+        """Read a body with chunked transfer encoding
+
+        Syntax:
+            Chunked-Body   = *chunk last-chunk trailer CRLF
+            chunk          = chunk-size [ chunk-extension ] CRLF
+                             chunk-data CRLF
+
+        Args:
+            body (file): file to write the body to
+            buff (str): data that has already been received
+            recv (function): receives more data from the socket
+
+        Returns:
+            str: data received after the body
+        """
+        total = 0
+        while True:
+            (line, buff) = self.read_line(buff, recv)
+            try:
+                size = int(line.split(';')[0].strip(), 16)
+            except ValueError:
+                raise BodyError("invalid chunk size")
+            if size < 0:
+                raise BodyError("invalid chunk size")
+            if size == 0:
+                break
+            total += size
+            if self.max_body_size is not None and total > self.max_body_size:
+                raise BodyTooLargeError
+            buff = self.read_exact(body, buff, size, recv)
+            (line, buff) = self.read_line(buff, recv)
+            if line != "":
+                raise BodyError("missing CRLF after chunk")
+        
+        """Skip the trailer"""
+        (line, buff) = self.read_line(buff, recv)
+        while line != "":
+            (line, buff) = self.read_line(buff, recv)
+        return buff
+
+    def receive(self, recv):
+        """Receive more data for a body
+
+        Args:
+            recv (function): receives more data from the socket
+
+        Returns:
+            str: the received data
+        """
+        data = recv(spool_size)
+        if len(data) == 0:
+            raise BodyError("connection closed")
+        return data
+
     def split_requests(self, buff):
         """Split multiple requests
         
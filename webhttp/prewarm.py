@@ -0,0 +1,137 @@
+"""Cache pre-warming
+
+This module contains a thread which fills the caches of document roots, so
+the first requests after a (re)start do not have to read and encode files.
+"""
+
+import os
+import threading
+
+import webhttp.resource
+
+
+def load_list(filename, vhosts):
+    """Load a list of resources to pre-warm
+
+    Every line contains a URI, optionally preceded by a host:
+
+        /index.html
+        example.com /images/logo.png
+
+    Args:
+        filename (str): path of the list
+        vhosts (webhttp.vhost.VirtualHosts): virtual hosts to resolve hosts
+
+    Returns:
+        list of (webhttp.resource.DocumentRoot, list of str): URIs to
+            pre-warm per document root
+    """
+    uris = dict()
+    with open(filename) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 1:
+                docroot = vhosts.default
+            elif len(parts) == 2:
+                docroot = vhosts.resolve(parts[0])
+            else:
+                continue
+            uris.setdefault(docroot, []).append(parts[-1])
+    return uris.items()
+
+
+class Prewarmer(threading.Thread):
+    """Thread which pre-warms the caches of document roots
+
+    Pre-warming stops when the loaded files and their gzip variants would
+    fill the file cache, files which are too large to be cached are skipped.
+    """
+
+    def __init__(self, targets, cache):
+        """Initialize the Prewarmer
+
+        Args:
+            targets (list of (webhttp.resource.DocumentRoot, list of str)):
+                URIs to pre-warm per document root, if the list of URIs is
+                None the access statistics of the previous run are used, or
+                the whole document root if there are none
+            cache (webhttp.resource.ContentCache): cache shared by the
+                document roots, which limits what is pre-warmed
+        """
+        super(Prewarmer, self).__init__()
+        self.daemon = True
+        self.targets = targets
+        self.cache = cache
+        self.remaining = cache.max_size
+
+    def find_uris(self, docroot):
+        """Find the URIs to pre-warm in a document root
+
+        Args:
+            docroot (webhttp.resource.DocumentRoot): document root
+
+        Returns:
+            list of str: URIs of the resources
+        """
+        uris = docroot.load_stats()
+        if uris:
+            return uris
+        total = 0
+        for (dirpath, dirnames, filenames) in os.walk(docroot.path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                size = os.path.getsize(path)
+                if size > self.cache.max_file_size:
+                    continue
+                total += size
+                if total > self.remaining:
+                    return uris
+                relpath = os.path.relpath(path, docroot.path)
+                uris.append("/" + relpath.replace(os.sep, "/"))
+        return uris
+
+    def warm(self, uri, docroot):
+        """Load a resource and its gzip variant into the caches
+
+        Args:
+            uri (str): URI of the resource
+            docroot (webhttp.resource.DocumentRoot): document root
+
+        Returns:
+            int: number of bytes loaded into the cache
+        """
+        try:
+            resource = webhttp.resource.Resource(uri, docroot)
+            if resource.get_content_length() > self.cache.max_file_size:
+                return 0
+            resource.generate_etag()
+            loaded = len(resource.get_content())
+            resource.encode_content("gzip")
+            loaded += len(resource.get_content())
+        except (webhttp.resource.FileExistError,
+                webhttp.resource.FileAccessError,
+                IOError, OSError):
+            return 0
+        return loaded
+
+    def run(self):
+        """Run the thread of the Prewarmer"""
+        for (docroot, uris) in self.targets:
+            if uris is None:
+                uris = self.find_uris(docroot)
+            warmed = 0
+            for (i, uri) in enumerate(uris):
+                if self.remaining <= 0:
+                    print("Pre-warming stopped, the cache is full")
+                    return
+                loaded = self.warm(uri, docroot)
+                if loaded:
+                    warmed += 1
+                    self.remaining -= loaded
+                if (i + 1) % 100 == 0:
+                    print("Pre-warming {}: {}/{}".format(
+                        docroot.path, i + 1, len(uris)
+                    ))
+            print("Pre-warmed {}: {} of {} resources".format(
+                docroot.path, warmed, len(uris)
+            ))
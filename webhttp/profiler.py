@@ -0,0 +1,79 @@
+"""Sampling profiler
+
+This module contains a profiler which samples the stacks of all threads of a
+running server, without having to restart it.
+"""
+
+import os
+import sys
+import threading
+import time
+
+
+class SamplingProfiler(threading.Thread):
+    """Thread which samples the stacks of all other threads"""
+
+    def __init__(self, filename, duration, interval=0.005):
+        """Initialize the SamplingProfiler
+
+        Args:
+            filename (str): file to write the profile to
+            duration (float): seconds to profile for
+            interval (float): seconds between samples
+        """
+        super(SamplingProfiler, self).__init__()
+        self.daemon = True
+        self.filename = filename
+        self.duration = duration
+        self.interval = interval
+        self.stacks = dict()
+
+    def format_frame(self, frame):
+        """Format a stack frame as "file:function:line"
+
+        Args:
+            frame (frame): stack frame
+
+        Returns:
+            str: description of the function of the frame
+        """
+        code = frame.f_code
+        return "{}:{}:{}".format(
+            os.path.basename(code.co_filename), code.co_name,
+            code.co_firstlineno
+        )
+
+    def sample(self):
+        """Take one sample of the stacks of all other threads"""
+        threads = dict((t.ident, t) for t in threading.enumerate())
+        for (ident, frame) in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.format_frame(frame))
+                frame = frame.f_back
+            if ident in threads:
+                # Group threads by type instead of name, i.e. all connections
+                stack.append(type(threads[ident]).__name__)
+            stack.reverse()
+            key = ";".join(stack)
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def write(self):
+        """Write the profile in the collapsed stack format, one stack per
+        line followed by the number of samples, as used by flame graph tools
+        """
+        stacks = sorted(self.stacks.items(), key=lambda s: s[1], reverse=True)
+        with open(self.filename, "w") as f:
+            for (stack, count) in stacks:
+                f.write("{} {}\n".format(stack, count))
+
+    def run(self):
+        """Run the thread of the SamplingProfiler"""
+        end = time.time() + self.duration
+        while time.time() < end:
+            self.sample()
+            time.sleep(self.interval)
+        self.write()
+        print("Profile written to {}".format(self.filename))
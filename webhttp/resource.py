@@ -5,10 +5,21 @@ This module contains a handler class for resources.
 
 import os
 import errno
+import hashlib
 import mimetypes
 import urlparse
+import urllib
+import cgi
 import gzip
 import shutil
+import struct
+import tempfile
+import contextlib
+import collections
+import threading
+
+# Folder for rendered directory listings in the folder of encoded resources
+autoindex_dir = ".autoindex"
 
 class FileExistError(Exception):
     """Exception which is raised when file does not exist"""
@@ -20,10 +31,342 @@ class FileAccessError(Exception):
     pass
 
 
+def make_dirs(path):
+    """Create a directory and its parents, if it does not exist yet
+
+    Args:
+        path (str): path of the directory
+    """
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """Open a temporary file which replaces the file at path when it is
+    closed, so other connections never see a partially written file
+
+    Args:
+        path (str): path of the file
+    """
+    path_dir = os.path.dirname(path)
+    make_dirs(path_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=path_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+    except:
+        os.remove(tmp_path)
+        raise
+    os.chmod(tmp_path, 0o644)
+    os.rename(tmp_path, path)
+
+
+def copy_mtime(source, path):
+    """Give a file the modification time of another file
+
+    Args:
+        source (str): path of the file to take the modification time from
+        path (str): path of the file to change
+    """
+    mtime = os.path.getmtime(source)
+    os.utime(path, (mtime, mtime))
+
+
+def same_mtime(source, path):
+    """Check if a file has the modification time of another file, as far as
+    os.utime can set it
+
+    Args:
+        source (str): path of the first file
+        path (str): path of the second file
+
+    Returns:
+        bool: True if the modification times are the same
+    """
+    return abs(os.path.getmtime(source) - os.path.getmtime(path)) < 1e-5
+
+
+class ContentCache:
+    """Class for caching the contents of files in memory, the least recently
+    used files are evicted when the cache exceeds its size
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024, max_file_size=1024 * 1024):
+        """Initialize the cache
+
+        Args:
+            max_size (int): maximum total size of the cached files in bytes
+            max_file_size (int): files larger than this are not cached
+        """
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def read(self, path):
+        """Read a file, using the cache if the file has not changed
+
+        Args:
+            path (str): path of the file
+
+        Returns:
+            str: contents of the file
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.discard(path)
+            raise
+        key = (stat.st_mtime, stat.st_size)
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                if entry[0] == key:
+                    # Move to the end, as most recently used
+                    self.entries[path] = entry
+                    return entry[1]
+                self.size -= len(entry[1])
+
+        with open(path, "rb") as f:
+            content = f.read()
+        if len(content) == stat.st_size and len(content) <= self.max_file_size:
+            self.store(path, key, content)
+        return content
+
+    def store(self, path, key, content):
+        """Store the contents of a file, evicting other files if needed
+
+        Args:
+            path (str): path of the file
+            key (tuple): modification time and size of the file
+            content (str): contents of the file
+        """
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                self.size -= len(entry[1])
+            self.entries[path] = (key, content)
+            self.size += len(content)
+            while self.size > self.max_size:
+                (_, (_, evicted)) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def discard(self, path):
+        """Remove a file from the cache
+
+        Args:
+            path (str): path of the file
+        """
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            if entry is not None:
+                self.size -= len(entry[1])
+
+
+class DocumentRoot:
+    """Class for representing a document root with its own caches"""
+
+    def __init__(self, path, encoded_path, autoindex=False, cache=None):
+        """Initialize the document root
+
+        Args:
+            path (str): directory containing the resources
+            encoded_path (str): directory for storing encoded resources
+            autoindex (bool): list directories without an index.html
+            cache (ContentCache): cache for the contents of files, which can
+                be shared with other document roots
+        """
+        self.path = path
+        self.encoded_path = encoded_path
+        self.autoindex = autoindex
+        self.stats_path = os.path.join(encoded_path, "access_stats")
+        if cache is None:
+            cache = ContentCache()
+        self.cache = cache
+        self.hits = dict()
+
+    def get_path(self, uri):
+        """Get the path of the file for a URI
+
+        Raises:
+            FileAccessError: if the path is outside of the document root or
+                contains a NUL byte
+
+        Args:
+            uri (str): Uniform Resource Identifier
+
+        Returns:
+            str: path of the file
+        """
+        out = urlparse.urlparse(uri)
+        relpath = urllib.unquote(out.path).lstrip("/")
+        if "\0" in relpath:
+            # Paths with a NUL byte can not be passed to the file system
+            raise FileAccessError
+        path = os.path.join(self.path, relpath)
+        root = os.path.abspath(self.path)
+        full_path = os.path.abspath(path)
+        if full_path != root and not full_path.startswith(root + os.sep):
+            raise FileAccessError
+        return path
+
+    def read(self, path):
+        """Read a file, using the cache if the file has not changed
+
+        Args:
+            path (str): path of the file
+
+        Returns:
+            str: contents of the file
+        """
+        return self.cache.read(path)
+
+    def write(self, uri, body_file):
+        """Create or replace the file for a URI
+
+        Raises:
+            FileAccessError: if the file cannot be written
+
+        Args:
+            uri (str): Uniform Resource Identifier
+            body_file (file): contents of the file, empty if None
+
+        Returns:
+            bool: True if the file was created, False if it was replaced
+        """
+        path = self.get_path(uri)
+        if uri.endswith("/") or os.path.isdir(path):
+            raise FileAccessError
+        created = not os.path.exists(path)
+        with atomic_write(path) as f:
+            if body_file is not None:
+                shutil.copyfileobj(body_file, f)
+        return created
+
+    def render_index(self, path):
+        """Render a listing of a directory
+
+        The listing is stored in its own folder with the encoded resources,
+        named after a hash of the directory so it can not collide with the
+        gzipped versions of files, and is re-used until the directory changes.
+
+        Raises:
+            FileAccessError: if the directory cannot be listed or the listing
+                cannot be stored
+
+        Args:
+            path (str): path of the directory
+
+        Returns:
+            str: path of the rendered listing
+        """
+        reldir = os.path.relpath(path, self.path)
+        index_path = os.path.join(
+            self.encoded_path, autoindex_dir,
+            hashlib.sha1(reldir).hexdigest() + ".html"
+        )
+        try:
+            if os.path.isfile(index_path) and same_mtime(path, index_path):
+                return index_path
+            self.write_index(path, reldir, index_path)
+            # The ETag of the listing follows the directory
+            copy_mtime(path, index_path)
+        except (IOError, OSError):
+            raise FileAccessError
+        return index_path
+
+    def write_index(self, path, reldir, index_path):
+        """Write the listing of a directory
+
+        Args:
+            path (str): path of the directory
+            reldir (str): path of the directory in the document root
+            index_path (str): path to write the listing to
+        """
+        if reldir == ".":
+            uri = "/"
+        else:
+            uri = "/" + reldir.replace(os.sep, "/") + "/"
+        names = []
+        if uri != "/":
+            names.append("../")
+        for name in sorted(os.listdir(path)):
+            if os.path.isdir(os.path.join(path, name)):
+                name += "/"
+            names.append(name)
+
+        lines = [
+            "<html>",
+            "    <head>",
+            "        <title> Index of {} </title>".format(cgi.escape(uri)),
+            "    </head>",
+            "    <body>",
+            "        <h1> Index of {} </h1>".format(cgi.escape(uri)),
+            "        <ul>",
+        ]
+        for name in names:
+            href = urllib.quote(uri + name)
+            if name == "../":
+                href = urllib.quote(uri.rstrip("/").rsplit("/", 1)[0] + "/")
+            lines.append("            <li><a href=\"{}\">{}</a></li>".format(
+                href, cgi.escape(name)
+            ))
+        lines += [
+            "        </ul>",
+            "    </body>",
+            "</html>",
+            "",
+        ]
+        with atomic_write(index_path) as f:
+            f.write("\n".join(lines))
+
+    def record_hit(self, uri):
+        """Count a request for a resource in the access statistics
+
+        Args:
+            uri (str): Uniform Resource Identifier
+        """
+        uri = urlparse.urlparse(uri).path
+        self.hits[uri] = self.hits.get(uri, 0) + 1
+
+    def save_stats(self):
+        """Save the access statistics, so they can be used by the next run
+
+        The file is replaced at once, the new process of a restart can be
+        reading it while this one saves.
+        """
+        if not self.hits:
+            return
+        hits = sorted(self.hits.items(), key=lambda hit: hit[1], reverse=True)
+        with atomic_write(self.stats_path) as f:
+            for (uri, count) in hits:
+                f.write("{} {}\n".format(count, uri))
+
+    def load_stats(self):
+        """Load the access statistics of a previous run
+
+        Returns:
+            list of str: URIs, most requested first
+        """
+        try:
+            with open(self.stats_path) as f:
+                return [line.split(" ", 1)[1].strip() for line in f if " " in line]
+        except IOError:
+            return []
+
+
+default_root = DocumentRoot("content", "temp")
+
+
 class Resource:
     """Class for representing a Resource (file)"""
 
-    def __init__(self, uri):
+    def __init__(self, uri, docroot=default_root):
         """Initialize the resource"
 
         Raises:
@@ -32,12 +375,24 @@ class Resource:
 
         Args:
             uri (str): Uniform Resource Identifier
+            docroot (DocumentRoot): document root containing the resource
         """
         self.uri = uri
-        out = urlparse.urlparse(uri)
-        self.path = os.path.join("content", out.path.lstrip("/"))
+        self.docroot = docroot
+        self.path = docroot.get_path(uri)
+        # Path of the resource relative to the folder of encoded resources
+        self.encoded_relpath = None
         if os.path.isdir(self.path):
-            self.path = os.path.join(self.path, "index.html")
+            index_path = os.path.join(self.path, "index.html")
+            if docroot.autoindex and not os.path.exists(index_path):
+                self.path = docroot.render_index(self.path)
+                self.encoded_relpath = os.path.relpath(
+                    self.path, docroot.encoded_path
+                )
+            else:
+                self.path = index_path
+        if self.encoded_relpath is None:
+            self.encoded_relpath = os.path.relpath(self.path, docroot.path)
         if not os.path.isfile(self.path):
             raise FileExistError
         if not os.access(self.path, os.R_OK):
@@ -59,7 +414,7 @@ class Resource:
         Returns:
             str: Contents of the resource
         """
-        return open(self.path).read()
+        return self.docroot.read(self.path)
 
     def get_content_type(self):
         """Get the content type, i.e "text/html"
@@ -72,19 +427,43 @@ class Resource:
 
     def encode_content(self, encoding):
         """Encodes the content of the path and stores it in a new file
+
+        The encoded file gets the modification time of the resource and is
+        re-used as long as the resource has the same modification time and
+        size, so a replaced resource with an older time is encoded again.
         """
         if encoding == "gzip":
-            new_path = os.path.join("temp", self.path.split("content")[1].lstrip("/")) 
+            new_path = os.path.join(
+                self.docroot.encoded_path, self.encoded_relpath
+            )
             new_path = new_path + ".gz"
-            new_path_dir = os.path.dirname(new_path)
-            try:
-                os.makedirs(new_path_dir)
-            except OSError:
-                if not os.path.isdir(new_path_dir):
-                    raise
-            with open(self.path, "rb") as f_in, gzip.open(new_path, "wb") as f_out:
-                shutil.copyfileobj(f_in, f_out)
+            if not self.is_gzip_current(new_path):
+                with open(self.path, "rb") as f_in, atomic_write(new_path) as f_tmp:
+                    with gzip.GzipFile(fileobj=f_tmp, mode="wb") as f_out:
+                        shutil.copyfileobj(f_in, f_out)
+                copy_mtime(self.path, new_path)
             self.path = new_path
+
+    def is_gzip_current(self, gzip_path):
+        """Check if a gzipped version of the resource is up to date
+
+        Args:
+            gzip_path (str): path of the gzipped version
+
+        Returns:
+            bool: True if it has the modification time and size of the
+                resource
+        """
+        try:
+            if not same_mtime(self.path, gzip_path):
+                return False
+            with open(gzip_path, "rb") as f:
+                # The size of the original data modulo 2^32 ends a gzip file
+                f.seek(-4, os.SEEK_END)
+                size = struct.unpack("<I", f.read(4))[0]
+        except (IOError, OSError, struct.error):
+            return False
+        return size == os.path.getsize(self.path) & 0xffffffff
     
     def get_content_encoding(self):
         """Get the content encoding, i.e "gzip"
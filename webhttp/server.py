@@ -3,55 +3,149 @@
 This module contains a HTTP server
 """
 
+import errno
+import fcntl
+import os
 import threading
 import socket
+import ssl
+import webhttp.message
 import webhttp.parser
 import webhttp.composer
+import webhttp.vhost
 
 class ConnectionHandler(threading.Thread):
     """Connection Handler for HTTP Server"""
 
-    def __init__(self, conn_socket, addr, timeout):
+    def __init__(self, conn_socket, addr, timeout, vhosts=None,
+                 max_body_size=None, allow_put=False):
         """Initialize the HTTP Connection Handler
         
         Args:
             conn_socket (socket): socket used for connection with client
             addr (str): ip address of client
             timeout (int): seconds until timeout
+            vhosts (webhttp.vhost.VirtualHosts): virtual hosts to serve
+            max_body_size (int): maximum size of a request body in bytes
+            allow_put (bool): allow clients to upload files with PUT
         """
         super(ConnectionHandler, self).__init__()
         self.daemon = True
         self.conn_socket = conn_socket
         self.addr = addr
         self.timeout = timeout
+        self.vhosts = vhosts
+        self.max_body_size = max_body_size
+        self.allow_put = allow_put
     
     def handle_connection(self):
         """Handle a new connection"""
         
-        parser = webhttp.parser.RequestParser()
-        composer = webhttp.composer.ResponseComposer(self.timeout)
+        parser = webhttp.parser.RequestParser(self.max_body_size)
+        composer = webhttp.composer.ResponseComposer(
+            self.timeout, self.vhosts, self.allow_put
+        )
         
         self.closed = False
         self.conn_socket.settimeout (self.timeout)
         
+        if isinstance(self.conn_socket, ssl.SSLSocket):
+            try:
+                self.conn_socket.do_handshake()
+            except (ssl.SSLError, socket.error):
+                self.close_connection()
+                return
+
+        request_buf = ""
+        # The end of the headers is not in request_buf before this position
+        scanned = 0
         while not self.closed:
+            responses = []
             try:
-                request_buf = self.conn_socket.recv(4096)
-                if len(request_buf) == 0:
+                data = self.conn_socket.recv(4096)
+                if len(data) == 0:
                     # The connection has been closed
                     self.close_connection()
                     break
-                requests = parser.parse_requests(request_buf)
+                request_buf += data
                 
-                for request in requests:
-                    response = composer.compose_response(request)
-                    self.conn_socket.send(str(response))
+                # Responses are composed in request order and sent in a single
+                # write, stopping at the first request that closes the
+                # connection. Incomplete requests are kept for the next recv.
+                while composer.get_persistent():
+                    end = request_buf.find('\r\n\r\n', scanned)
+                    if end < 0:
+                        if len(request_buf) > webhttp.parser.max_header_size:
+                            raise webhttp.parser.RequestError(
+                                "headers too large"
+                            )
+                        # The end can start in the last bytes received
+                        scanned = max(0, len(request_buf) - 3)
+                        break
+                    if end + 4 > webhttp.parser.max_header_size:
+                        raise webhttp.parser.RequestError("headers too large")
+                    requests = parser.parse_requests(request_buf[:end + 4])
+                    request_buf = request_buf[end + 4:]
+                    scanned = 0
+                    if not requests:
+                        continue
+                    request = requests[0]
+                    if parser.has_body(request):
+                        request_buf = self.receive_body(
+                            parser, request, request_buf, responses
+                        )
+                    responses.append(str(composer.compose_response(request)))
+                    if request.body_file is not None:
+                        request.body_file.close()
+                self.conn_socket.sendall("".join(responses))
                 
                 if not composer.get_persistent():
                     self.close_connection()
+            except webhttp.parser.BodyTooLargeError:
+                responses.append(str(composer.compose_error(413, True, True)))
+                self.conn_socket.sendall("".join(responses))
+                self.close_connection()
+            except (webhttp.parser.RequestError, webhttp.parser.BodyError):
+                responses.append(str(composer.compose_error(400, True, True)))
+                self.conn_socket.sendall("".join(responses))
+                self.close_connection()
             except socket.timeout:
-                self.conn_socket.send(str(composer.compose_error(408, False, True)))
+                responses.append(str(composer.compose_error(408, False, True)))
+                self.conn_socket.sendall("".join(responses))
+                self.close_connection()
+            except ssl.SSLError as e:
+                # Timeouts on TLS sockets are raised as SSLError
+                if "timed out" in str(e):
+                    responses.append(str(composer.compose_error(408, False, True)))
+                    self.conn_socket.sendall("".join(responses))
                 self.close_connection()
+            except socket.error:
+                # The connection has been reset by the client
+                self.close_connection()
+    
+    def receive_body(self, parser, request, request_buf, responses):
+        """Receive the body of a request
+        
+        Args:
+            parser (webhttp.parser.RequestParser): parser of the connection
+            request (webhttp.Request): request with parsed headers
+            request_buf (str): data received after the headers
+            responses (list of str): responses which have not been sent yet
+
+        Returns:
+            str: data received after the body
+        """
+        if request.get_header("Expect").lower() == "100-continue":
+            if request.get_header("Transfer-Encoding") == "":
+                # Check the size before the client sends the body
+                parser.get_content_length(request)
+            # Earlier responses have to be sent before the 100 response
+            continue_response = webhttp.message.Response()
+            continue_response.code = 100
+            responses.append(str(continue_response))
+            self.conn_socket.sendall("".join(responses))
+            del responses[:]
+        return parser.parse_body(request, request_buf, self.conn_socket.recv)
         
     def close_connection(self):
 #        print "connection closed"
@@ -66,28 +160,121 @@ class ConnectionHandler(threading.Thread):
 class Server:
     """HTTP Server"""
 
-    def __init__(self, hostname, server_port, timeout):
+    def __init__(self, hostname, server_port, timeout,
+                 certfile=None, keyfile=None, vhosts=None, listen_fd=None,
+                 max_body_size=None, allow_put=False):
         """Initialize the HTTP server
         
         Args:
             hostname (str): hostname of the server
             server_port (int): port that the server is listening on
             timeout (int): seconds until timeout
+            certfile (str): path to TLS certificate, enables HTTPS if given
+            keyfile (str): path to TLS private key
+            vhosts (webhttp.vhost.VirtualHosts): virtual hosts to serve
+            listen_fd (int): file descriptor of an inherited listening socket
+            max_body_size (int): maximum size of a request body in bytes
+            allow_put (bool): allow clients to upload files with PUT
         """
         self.hostname = hostname
         self.server_port = server_port
         self.timeout = timeout
+        self.listen_fd = listen_fd
+        self.max_body_size = max_body_size
+        self.allow_put = allow_put
+        self.handlers = []
         self.done = False
+        if vhosts is None:
+            vhosts = webhttp.vhost.VirtualHosts()
+        self.vhosts = vhosts
+        self.ssl_context = None
+        if certfile:
+            self.ssl_context = self.make_ssl_context(certfile, keyfile)
+    
+    def make_ssl_context(self, certfile, keyfile):
+        """Create the TLS context shared by all connections
+
+        The context keeps the server side session cache and OpenSSL issues
+        session tickets by default, so clients that reconnect can resume
+        their session instead of doing a full handshake.
+
+        Args:
+            certfile (str): path to TLS certificate
+            keyfile (str): path to TLS private key
+
+        Returns:
+            ssl.SSLContext: context for wrapping connection sockets
+        """
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+        context.load_cert_chain(certfile, keyfile)
+        return context
     
     def run(self):
         """Run the HTTP Server and start listening"""
-        self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.serverSocket.bind((self.hostname, self.server_port))
-        self.serverSocket.listen(1)
+        if self.listen_fd is None:
+            self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.serverSocket.bind((self.hostname, self.server_port))
+            self.serverSocket.listen(5)
+        else:
+            # Socket handed over by the previous process, already listening
+            self.serverSocket = socket.fromfd(
+                self.listen_fd, socket.AF_INET, socket.SOCK_STREAM
+            )
+            os.close(self.listen_fd)
         while not self.done:
-            conn_socket, addr = self.serverSocket.accept()
-            handler = ConnectionHandler(conn_socket, addr, self.timeout)
-            handler.run()
+            try:
+                conn_socket, addr = self.serverSocket.accept()
+            except socket.error as e:
+                # Interrupted by a signal, or closed by shutdown
+                if self.done or e.errno == errno.EINTR:
+                    continue
+                raise
+            # Only the listening socket is handed over to a new process on a
+            # restart, connections stay with this process
+            flags = fcntl.fcntl(conn_socket.fileno(), fcntl.F_GETFD)
+            fcntl.fcntl(conn_socket.fileno(), fcntl.F_SETFD,
+                        flags | fcntl.FD_CLOEXEC)
+            if self.ssl_context:
+                # The handshake is done by the connection handler
+                conn_socket = self.ssl_context.wrap_socket(
+                    conn_socket, server_side=True,
+                    do_handshake_on_connect=False
+                )
+            handler = ConnectionHandler(conn_socket, addr, self.timeout,
+                                        self.vhosts, self.max_body_size,
+                                        self.allow_put)
+            handler.start()
+            self.handlers = [h for h in self.handlers if h.is_alive()]
+            self.handlers.append(handler)
+    
+    def reload(self, timeout, vhosts):
+        """Change the settings of the HTTP server
+
+        Connections which are already open keep their old settings.
+
+        Args:
+            timeout (int): seconds until timeout
+            vhosts (webhttp.vhost.VirtualHosts): virtual hosts to serve
+        """
+        self.timeout = timeout
+        self.vhosts = vhosts
+    
+    def get_listen_fd(self):
+        """Get the file descriptor of the listening socket
+
+        Returns:
+            int: file descriptor, which can be passed to a new process
+        """
+        return self.serverSocket.fileno()
+    
+    def wait(self):
+        """Wait until all open connections are finished"""
+        for handler in self.handlers:
+            # Join with a timeout, so signals are still handled
+            while handler.is_alive():
+                handler.join(1)
     
     def shutdown(self):
         """Safely shut down the HTTP server"""
@@ -0,0 +1,111 @@
+"""Virtual hosts
+
+This module contains an index of virtual hosts, which maps the value of the
+Host header to a document root.
+"""
+
+import os
+import ConfigParser
+
+import webhttp.resource
+
+
+class VirtualHosts:
+    """Class for resolving Host values to document roots"""
+
+    def __init__(self, default_path="content", autoindex=False, cache=None):
+        """Initialize the virtual hosts
+
+        Args:
+            default_path (str): document root for unknown hosts
+            autoindex (bool): list directories without an index.html, unless
+                configured otherwise for a host
+            cache (webhttp.resource.ContentCache): cache for the contents of
+                files, shared by all document roots
+        """
+        self.autoindex = autoindex
+        if cache is None:
+            cache = webhttp.resource.ContentCache()
+        self.cache = cache
+        self.default = webhttp.resource.DocumentRoot(
+            default_path, os.path.join("temp", "default"), autoindex, cache
+        )
+        self.hosts = dict()
+
+    def add_host(self, host, path, autoindex=None):
+        """Add a virtual host
+
+        Args:
+            host (str): value of the Host header, without port
+            path (str): document root of the host
+            autoindex (bool): list directories without an index.html, the
+                default of the virtual hosts is used if None
+        """
+        if autoindex is None:
+            autoindex = self.autoindex
+        host = host.lower()
+        self.hosts[host] = webhttp.resource.DocumentRoot(
+            path, os.path.join("temp", host), autoindex, self.cache
+        )
+
+    def load(self, filename):
+        """Load virtual hosts from a configuration file
+
+        Every section of the file is a host, the option "root" gives its
+        document root and the optional "autoindex" enables directory listings:
+
+            [example.com]
+            root = content/example
+            autoindex = yes
+
+        Args:
+            filename (str): path of the configuration file
+        """
+        config = ConfigParser.RawConfigParser()
+        with open(filename) as f:
+            config.readfp(f)
+        for host in config.sections():
+            autoindex = None
+            if config.has_option(host, "autoindex"):
+                autoindex = config.getboolean(host, "autoindex")
+            self.add_host(host, config.get(host, "root"), autoindex)
+
+    def get_roots(self):
+        """Get all document roots
+
+        Returns:
+            list of webhttp.resource.DocumentRoot
+        """
+        return [self.default] + self.hosts.values()
+
+    def reuse_roots(self, old):
+        """Take over unchanged document roots, with their caches, from the
+        virtual hosts that were used before a reload
+
+        Args:
+            old (webhttp.vhost.VirtualHosts): previous virtual hosts
+        """
+        def key(docroot):
+            return (docroot.path, docroot.encoded_path, docroot.autoindex)
+
+        old_roots = dict()
+        for docroot in old.get_roots():
+            old_roots[key(docroot)] = docroot
+        self.default = old_roots.get(key(self.default), self.default)
+        for (host, docroot) in self.hosts.items():
+            self.hosts[host] = old_roots.get(key(docroot), docroot)
+
+    def resolve(self, host):
+        """Find the document root for a Host value
+
+        Args:
+            host (str): value of the Host header
+
+        Returns:
+            webhttp.resource.DocumentRoot: document root of the host
+        """
+        if not host.endswith("]"):
+            # Strip the port, IPv6 addresses are enclosed in brackets
+            host = host.rsplit(":", 1)[0]
+        host = host.lower()
+        return self.hosts.get(host, self.default)
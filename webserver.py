@@ -1,23 +1,232 @@
 import argparse
+import ConfigParser
+import os
+import signal
+import subprocess
+import sys
+import time
+import webhttp.prewarm
+import webhttp.profiler
+import webhttp.resource
 import webhttp.server
+import webhttp.vhost
+
+# Environment variable for handing the listening socket to a new process
+LISTEN_FD_ENV = "WEBHTTP_LISTEN_FD"
+
+
+def load_settings(args, cache):
+    """Load the settings which can be changed while running
+
+    Options given on the command line override the [server] section of the
+    configuration file, which overrides the defaults.
+
+    Args:
+        args (argparse.Namespace): command line options
+        cache (webhttp.resource.ContentCache): cache shared by all document
+            roots
+
+    Returns:
+        (int, webhttp.vhost.VirtualHosts): timeout and virtual hosts
+    """
+    timeout = 15
+    root = "content"
+    autoindex = False
+    vhosts_file = None
+    if args.config:
+        config = ConfigParser.RawConfigParser()
+        with open(args.config) as f:
+            config.readfp(f)
+        if config.has_option("server", "timeout"):
+            timeout = config.getint("server", "timeout")
+        if config.has_option("server", "root"):
+            root = config.get("server", "root")
+        if config.has_option("server", "autoindex"):
+            autoindex = config.getboolean("server", "autoindex")
+        if config.has_option("server", "vhosts"):
+            vhosts_file = config.get("server", "vhosts")
+
+    if args.timeout is not None:
+        timeout = args.timeout
+    if args.root is not None:
+        root = args.root
+    if args.autoindex is not None:
+        autoindex = args.autoindex
+    if args.vhosts is not None:
+        vhosts_file = args.vhosts
+
+    vhosts = webhttp.vhost.VirtualHosts(root, autoindex, cache)
+    if vhosts_file:
+        vhosts.load(vhosts_file)
+    return (timeout, vhosts)
+
+
+def reload_settings(server, args, cache):
+    """Reload the settings of a running server
+
+    The server keeps its old settings if the configuration cannot be loaded.
+
+    Args:
+        server (webhttp.server.Server): server to reload
+        args (argparse.Namespace): command line options
+        cache (webhttp.resource.ContentCache): cache shared by all document
+            roots
+
+    Returns:
+        bool: True if the settings were reloaded
+    """
+    try:
+        timeout, vhosts = load_settings(args, cache)
+    except (IOError, ValueError, ConfigParser.Error) as e:
+        print("Failed to reload configuration: {}".format(e))
+        return False
+    vhosts.reuse_roots(server.vhosts)
+    server.reload(timeout, vhosts)
+    return True
+
+
+def save_stats(vhosts):
+    """Save the access statistics of all document roots
+
+    Args:
+        vhosts (webhttp.vhost.VirtualHosts): virtual hosts
+    """
+    for docroot in vhosts.get_roots():
+        try:
+            docroot.save_stats()
+        except (IOError, OSError) as e:
+            print("Failed to save access statistics: {}".format(e))
+
 
 # Create and start the HTTP Server
 # Use `python webserver.py --help` to display command line options
+#
+# Signals:
+#     SIGHUP: reload the configuration file
+#     SIGUSR1: profile the server for --profile-seconds
+#     SIGUSR2: start a new server process on the same socket, this process
+#              stops accepting and exits when its open connections are done
+#     SIGTERM: stop accepting and exit when open connections are done
 if __name__ == '__main__':
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="HTTP Server")
     parser.add_argument("-a", "--address", type=str, default="localhost")
     parser.add_argument("-p", "--port", type=int, default=8001)
-    parser.add_argument("-t", "--timeout", type=int, default=15)
+    parser.add_argument("-t", "--timeout", type=int, default=None,
+                        help="seconds until timeout (default: 15)")
+    parser.add_argument("-c", "--cert", type=str, default=None,
+                        help="TLS certificate file, serve HTTPS if given")
+    parser.add_argument("-k", "--key", type=str, default=None,
+                        help="TLS private key file")
+    parser.add_argument("-r", "--root", type=str, default=None,
+                        help="document root for unknown hosts "
+                             "(default: content)")
+    parser.add_argument("--vhosts", type=str, default=None,
+                        help="virtual hosts configuration file")
+    parser.add_argument("--autoindex", action="store_true", default=None,
+                        help="list directories without an index.html")
+    parser.add_argument("--config", type=str, default=None,
+                        help="configuration file, reloaded on SIGHUP")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="pre-warm caches in the background at startup")
+    parser.add_argument("--prewarm-list", type=str, default=None,
+                        help="file with the resources to pre-warm")
+    parser.add_argument("--profile-seconds", type=float, default=10,
+                        help="duration of a profile started by SIGUSR1")
+    parser.add_argument("--profile-dir", type=str, default="temp",
+                        help="directory to write profiles to")
+    parser.add_argument("--max-body-size", type=int, default=10 * 1024 * 1024,
+                        help="maximum size of a request body in bytes")
+    parser.add_argument("--allow-put", action="store_true",
+                        help="allow clients to upload files with PUT")
+    parser.add_argument("--cache-size", type=int, default=64 * 1024 * 1024,
+                        help="maximum size of the file cache in bytes")
+    parser.add_argument("--cache-file-size", type=int, default=1024 * 1024,
+                        help="files larger than this are not cached")
     args = parser.parse_args()
 
+    cache = webhttp.resource.ContentCache(args.cache_size, args.cache_file_size)
+    timeout, vhosts = load_settings(args, cache)
+    listen_fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if listen_fd is not None:
+        listen_fd = int(listen_fd)
+
     # Start server
-    server = webhttp.server.Server(args.address, args.port, args.timeout)
+    server = webhttp.server.Server(args.address, args.port, timeout,
+                                   args.cert, args.key, vhosts, listen_fd,
+                                   args.max_body_size, args.allow_put)
+
+    def reload(signum, frame):
+        reload_settings(server, args, cache)
+
+    # The new process started by SIGUSR2, until it has stopped this one
+    restarting = {"process": None}
+
+    def restart(signum, frame):
+        # The new process stops this one with SIGTERM once it is ready
+        if server.done:
+            # The socket has already been handed over or closed
+            print("Already stopping, not restarting")
+            return
+        current = restarting["process"]
+        if current is not None and current.poll() is None:
+            print("Already restarting")
+            return
+        save_stats(server.vhosts)
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(server.get_listen_fd())
+        try:
+            restarting["process"] = subprocess.Popen(
+                [sys.executable] + sys.argv, env=env
+            )
+        except OSError as e:
+            print("Failed to restart: {}".format(e))
+
+    def stop(signum, frame):
+        server.shutdown()
+
+    # Only the current profiler is kept, a finished one is replaced
+    profiling = {"profiler": None}
+
+    def profile(signum, frame):
+        current = profiling["profiler"]
+        if current is not None and current.is_alive():
+            print("Already profiling")
+            return
+        try:
+            webhttp.resource.make_dirs(args.profile_dir)
+        except OSError as e:
+            print("Failed to start profiling: {}".format(e))
+            return
+        filename = os.path.join(args.profile_dir, "profile-{}-{}.txt".format(
+            os.getpid(), time.strftime("%Y%m%d%H%M%S")
+        ))
+        profiling["profiler"] = webhttp.profiler.SamplingProfiler(
+            filename, args.profile_seconds
+        )
+        profiling["profiler"].start()
+
+    signal.signal(signal.SIGHUP, reload)
+    signal.signal(signal.SIGUSR1, profile)
+    signal.signal(signal.SIGUSR2, restart)
+    signal.signal(signal.SIGTERM, stop)
+
+    if listen_fd is not None:
+        # Tell the previous process to stop accepting connections
+        os.kill(os.getppid(), signal.SIGTERM)
+
+    # Pre-warm caches while the server is already accepting
+    if args.prewarm_list:
+        targets = webhttp.prewarm.load_list(args.prewarm_list, vhosts)
+        webhttp.prewarm.Prewarmer(targets, cache).start()
+    elif args.prewarm:
+        targets = [(docroot, None) for docroot in vhosts.get_roots()]
+        webhttp.prewarm.Prewarmer(targets, cache).start()
+
     try:
         server.run()
+        server.wait()
     except KeyboardInterrupt:
         server.shutdown()
         print ("")
-            
-
-
+    save_stats(server.vhosts)
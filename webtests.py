@@ -1,12 +1,29 @@
 import unittest
+import os
+import shutil
 import socket
+import ssl
 import sys
+import tempfile
+import threading
+import argparse
+import gzip
 
 import webhttp.message
 import webhttp.parser
+import webhttp.prewarm
+import webhttp.profiler
+import webhttp.resource
+import webhttp.server
+import webhttp.vhost
+import webserver
 
 
 portnr = 8001
+https_portnr = 0
+vhosts_enabled = False
+put_enabled = False
+autoindex_enabled = False
 
 
 class TestGetRequests(unittest.TestCase):
@@ -54,6 +71,21 @@ class TestGetRequests(unittest.TestCase):
         response = self.parser.parse_response(message)
         self.assertEqual(response.code, 404)
 
+    def test_nul_byte(self):
+        """GET for a resource with an encoded NUL byte in its path"""
+        # Send the request
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index%00.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "close")
+        self.client_socket.send(str(request))
+
+        # Test response
+        message = self.client_socket.recv(1024)
+        response = self.parser.parse_response(message)
+        self.assertEqual(response.code, 403)
+
     def test_caching(self):
         """GET for an existing single resource followed by a GET for that same
         resource with caching utilized on the client/tester side
@@ -108,6 +140,8 @@ class TestGetRequests(unittest.TestCase):
 
     def test_nonexistant_index_file(self):
         """GET for a directory with a non-existant index.html file"""
+        if autoindex_enabled:
+            self.skipTest("server started with --autoindex")
         # Send the request
         request = webhttp.message.Request()
         request.method = "GET"
@@ -155,6 +189,83 @@ class TestGetRequests(unittest.TestCase):
         except socket.error:
             pass
 
+    def test_pipelining_close(self):
+        """Multiple pipelined GETs sent at once, with a GET in the middle
+        prompting closing the connection, only the responses up to and
+        including that GET should be sent.
+        """
+        # Send the requests
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        pipeline = str(request) * 2
+        request.set_header("Connection", "close")
+        pipeline += str(request)
+        request.set_header("Connection", "keep-alive")
+        pipeline += str(request) * 2
+        self.client_socket.send(pipeline)
+
+        # Read until the server closes the connection
+        self.client_socket.settimeout(10)
+        message = ""
+        while True:
+            data = self.client_socket.recv(4096)
+            if len(data) == 0:
+                break
+            message += data
+        self.assertEqual(message.count("HTTP/1.1 200 OK"), 3)
+
+    def test_headers_too_large(self):
+        """Headers larger than the limit are refused after the responses to
+        the requests before them
+        """
+        # Send the requests
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        # The server has received all data when the limit is exceeded
+        headers = "GET / HTTP/1.1\r\nX-Padding: "
+        headers += "x" * (webhttp.parser.max_header_size + 1 - len(headers))
+        self.client_socket.send(str(request) + headers)
+
+        # Read until the server closes the connection
+        self.client_socket.settimeout(10)
+        message = ""
+        while True:
+            data = self.client_socket.recv(4096)
+            if len(data) == 0:
+                break
+            message += data
+        self.assertTrue(message.startswith("HTTP/1.1 200 OK"))
+        self.assertIn("HTTP/1.1 400", message)
+
+    def test_malformed_request(self):
+        """A malformed request line is refused after the responses to the
+        requests before it
+        """
+        # Send the requests
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        self.client_socket.send(str(request) + "GARBAGE\r\n\r\n")
+
+        # Read until the server closes the connection
+        self.client_socket.settimeout(10)
+        message = ""
+        while True:
+            data = self.client_socket.recv(4096)
+            if len(data) == 0:
+                break
+            message += data
+        self.assertTrue(message.startswith("HTTP/1.1 200 OK"))
+        self.assertIn("HTTP/1.1 400", message)
+
     def test_persistent_timeout(self):
         """Multiple GETs over the same (persistent) connection, followed by a
         wait during which the connection times out, the connection should be
@@ -210,15 +321,649 @@ class TestGetRequests(unittest.TestCase):
         self.assertEqual(response.get_header("Content-Encoding"), "gzip")
 
 
+class TestHttpsRequests(unittest.TestCase):
+    """Test cases for GET requests over HTTPS, these are only run when the
+    port of a HTTPS server is given with --https-port
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        if not https_portnr:
+            self.skipTest("no HTTPS server given")
+        self.client_socket = ssl.wrap_socket(
+            socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        )
+        self.client_socket.connect(("localhost", https_portnr))
+        self.parser = webhttp.parser.ResponseParser()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.client_socket.close()
+
+    def test_existing_file(self):
+        """GET for a single resource that exists over HTTPS"""
+        # Send the request
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(https_portnr))
+        request.set_header("Connection", "close")
+        self.client_socket.send(str(request))
+
+        # Test response
+        message = self.client_socket.recv(1024)
+        response = self.parser.parse_response(message)
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.body)
+
+    def test_encoding(self):
+        """GET which requests an existing resource using gzip encoding over
+        HTTPS
+        """
+        # Send the request
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(https_portnr))
+        request.set_header("Connection", "close")
+        request.set_header("Accept-Encoding", "gzip")
+        self.client_socket.send(str(request))
+
+        # Test response
+        message = self.client_socket.recv(1024)
+        response = self.parser.parse_response(message)
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.body)
+        self.assertEqual(response.get_header("Content-Encoding"), "gzip")
+
+
+class TestVirtualHosts(unittest.TestCase):
+    """Test cases for virtual hosts, these are only run when the server is
+    started with vhosts.ini and --vhosts is given
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        if not vhosts_enabled:
+            self.skipTest("server not started with vhosts.ini")
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_socket.connect(("localhost", portnr))
+        self.parser = webhttp.parser.ResponseParser()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.client_socket.close()
+
+    def get_index(self, host):
+        """GET /index.html from a host and return the response"""
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/index.html"
+        request.set_header("Host", "{}:{}".format(host, portnr))
+        request.set_header("Connection", "close")
+        self.client_socket.send(str(request))
+        message = self.client_socket.recv(1024)
+        return self.parser.parse_response(message)
+
+    def test_virtual_host(self):
+        """GET for a resource that only exists in the root of a virtual host"""
+        response = self.get_index("test.localhost")
+        self.assertEqual(response.code, 200)
+        self.assertTrue(response.body)
+
+    def test_other_host(self):
+        """GET for the same resource from another host, which does not have
+        the resource in its root
+        """
+        response = self.get_index("localhost")
+        self.assertEqual(response.code, 404)
+
+
+class TestRequestBodies(unittest.TestCase):
+    """Test cases for requests with a body"""
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_socket.connect(("localhost", portnr))
+        self.client_socket.settimeout(10)
+        self.parser = webhttp.parser.ResponseParser()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.client_socket.close()
+
+    def make_get(self):
+        """Make a GET request which closes the connection"""
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "close")
+        return request
+
+    def receive_all(self):
+        """Receive until the server closes the connection"""
+        message = ""
+        while True:
+            data = self.client_socket.recv(4096)
+            if len(data) == 0:
+                return message
+            message += data
+
+    def test_content_length_body(self):
+        """POST with a body containing an empty line, followed by a pipelined
+        GET, the body should not be parsed as a request
+        """
+        request = webhttp.message.Request()
+        request.method = "POST"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        request.body = "a=1\r\n\r\nGET / HTTP/1.1\r\n\r\n"
+        request.set_header("Content-Length", len(request.body))
+        self.client_socket.send(str(request) + str(self.make_get()))
+
+        message = self.receive_all()
+        self.assertEqual(message.count("HTTP/1.1 200 OK"), 2)
+        self.assertNotIn("404", message)
+
+    def test_chunked_body(self):
+        """POST with a chunked body, followed by a pipelined GET"""
+        request = webhttp.message.Request()
+        request.method = "POST"
+        request.uri = "/test/index.html"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        request.set_header("Transfer-Encoding", "chunked")
+        request.body = "5\r\nhello\r\n6\r\n world\r\n0\r\n\r\n"
+        self.client_socket.send(str(request) + str(self.make_get()))
+
+        message = self.receive_all()
+        self.assertEqual(message.count("HTTP/1.1 200 OK"), 2)
+
+    def test_body_timeout(self):
+        """A body which is not sent completely times out, the response to the
+        GET before it is still sent
+        """
+        request = self.make_get()
+        request.set_header("Connection", "keep-alive")
+        pipeline = str(request)
+        request.method = "POST"
+        request.set_header("Content-Length", 10)
+        pipeline += str(request) + "abc"
+        self.client_socket.send(pipeline)
+
+        message = self.receive_all()
+        self.assertTrue(message.startswith("HTTP/1.1 200 OK"))
+        self.assertIn("HTTP/1.1 408", message)
+
+    def test_body_too_large(self):
+        """PUT with a body larger than the limit, which is refused before the
+        body is sent
+        """
+        request = webhttp.message.Request()
+        request.method = "PUT"
+        request.uri = "/test/large.txt"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Expect", "100-continue")
+        request.set_header("Content-Length", 1024 * 1024 * 1024)
+        self.client_socket.send(str(request))
+
+        message = self.client_socket.recv(1024)
+        response = self.parser.parse_response(message)
+        self.assertEqual(response.code, 413)
+        self.assertEqual(response.get_header("Connection"), "close")
+
+
+class TestPut(unittest.TestCase):
+    """Test cases for PUT requests, these are only run when the server is
+    started with --allow-put and --allow-put is given
+    """
+
+    path = os.path.join("content", "test", "put.txt")
+
+    def setUp(self):
+        """Prepare for testing"""
+        if not put_enabled:
+            self.skipTest("server not started with --allow-put")
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_socket.connect(("localhost", portnr))
+        self.parser = webhttp.parser.ResponseParser()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.client_socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def put(self, body):
+        """PUT a body to /test/put.txt and return the response"""
+        request = webhttp.message.Request()
+        request.method = "PUT"
+        request.uri = "/test/put.txt"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        request.set_header("Content-Length", len(body))
+        request.body = body
+        self.client_socket.send(str(request))
+        message = self.client_socket.recv(1024)
+        return self.parser.parse_response(message)
+
+    def test_put(self):
+        """PUT for a new resource followed by a PUT replacing it"""
+        self.assertEqual(self.put("first").code, 201)
+        self.assertEqual(self.put("second").code, 204)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "second")
+
+
+class TestAutoindex(unittest.TestCase):
+    """Test cases for directory listings, these are only run when the server
+    is started with --autoindex and --autoindex is given
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        if not autoindex_enabled:
+            self.skipTest("server not started with --autoindex")
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.client_socket.connect(("localhost", portnr))
+        self.parser = webhttp.parser.ResponseParser()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.client_socket.close()
+
+    def get_root(self, etag=None, encoding=None):
+        """GET the directory without index.html and return the response"""
+        request = webhttp.message.Request()
+        request.method = "GET"
+        request.uri = "/"
+        request.set_header("Host", "localhost:{}".format(portnr))
+        request.set_header("Connection", "keep-alive")
+        if etag:
+            request.set_header("If-None-Match", etag)
+        if encoding:
+            request.set_header("Accept-Encoding", encoding)
+        self.client_socket.send(str(request))
+        message = self.client_socket.recv(4096)
+        return self.parser.parse_response(message)
+
+    def test_listing(self):
+        """GET for a directory with a non-existant index.html file, which is
+        listed
+        """
+        response = self.get_root()
+        self.assertEqual(response.code, 200)
+        self.assertIn("test/", response.body)
+
+    def test_listing_caching(self):
+        """GET for a directory listing followed by a GET with its ETag"""
+        etag = self.get_root().get_header("ETag")
+        self.assertTrue(etag)
+        self.assertEqual(self.get_root(etag).code, 304)
+
+    def test_listing_encoding(self):
+        """GET for a directory listing using gzip encoding"""
+        response = self.get_root(encoding="gzip")
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.get_header("Content-Encoding"), "gzip")
+
+
+class TestContentCache(unittest.TestCase):
+    """Test cases for the file cache, these do not use the server"""
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.cache = webhttp.resource.ContentCache(10, 6)
+
+    def tearDown(self):
+        """Clean up after testing"""
+        shutil.rmtree(self.directory)
+
+    def make_file(self, name, content):
+        """Create a file in the test directory and return its path"""
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_eviction(self):
+        """The least recently used file is evicted when the cache is full"""
+        a = self.make_file("a", "aaaaa")
+        b = self.make_file("b", "bbbbb")
+        c = self.make_file("c", "ccccc")
+        self.cache.read(a)
+        self.cache.read(b)
+        self.cache.read(a)
+        self.cache.read(c)
+        self.assertIn(a, self.cache.entries)
+        self.assertNotIn(b, self.cache.entries)
+        self.assertIn(c, self.cache.entries)
+        self.assertEqual(self.cache.size, 10)
+
+    def test_large_file(self):
+        """Files larger than the file size limit are read, but not cached"""
+        path = self.make_file("large", "0123456789")
+        self.assertEqual(self.cache.read(path), "0123456789")
+        self.assertEqual(self.cache.size, 0)
+
+    def test_changed_file(self):
+        """A file which changed is read again"""
+        path = self.make_file("a", "old")
+        self.assertEqual(self.cache.read(path), "old")
+        self.make_file("a", "newer")
+        self.assertEqual(self.cache.read(path), "newer")
+        self.assertEqual(self.cache.size, 5)
+
+
+class TestEncoding(unittest.TestCase):
+    """Test cases for gzipped versions of resources, these do not use the
+    server
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, "root")
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.docroot = webhttp.resource.DocumentRoot(
+            self.root, os.path.join(self.directory, "encoded"), True
+        )
+
+    def tearDown(self):
+        """Clean up after testing"""
+        shutil.rmtree(self.directory)
+
+    def get_gzipped(self, uri):
+        """Get the uncompressed contents of the gzipped version of a URI"""
+        resource = webhttp.resource.Resource(uri, self.docroot)
+        resource.encode_content("gzip")
+        with gzip.open(resource.path, "rb") as f:
+            return f.read()
+
+    def test_replaced_file(self):
+        """A file replaced by one with an older modification time is
+        encoded again
+        """
+        path = os.path.join(self.root, "a.txt")
+        with open(path, "w") as f:
+            f.write("old")
+        self.assertEqual(self.get_gzipped("/a.txt"), "old")
+
+        with open(path, "w") as f:
+            f.write("new!")
+        earlier = os.path.getmtime(path) - 100
+        os.utime(path, (earlier, earlier))
+        self.assertEqual(self.get_gzipped("/a.txt"), "new!")
+
+    def test_changed_listing(self):
+        """The gzipped listing follows a directory which gets an older
+        modification time
+        """
+        sub = os.path.join(self.root, "sub")
+        self.assertNotIn("new.txt", self.get_gzipped("/sub/"))
+
+        open(os.path.join(sub, "new.txt"), "w").close()
+        earlier = os.path.getmtime(sub) - 100
+        os.utime(sub, (earlier, earlier))
+        self.assertIn("new.txt", self.get_gzipped("/sub/"))
+
+
+class TestListing(unittest.TestCase):
+    """Test cases for rendered directory listings, these do not use the
+    server
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, "root")
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.docroot = webhttp.resource.DocumentRoot(
+            self.root, os.path.join(self.directory, "encoded"), True
+        )
+
+    def tearDown(self):
+        """Clean up after testing"""
+        shutil.rmtree(self.directory)
+
+    def test_changed_directory(self):
+        """The listing is rendered again when the directory changes"""
+        resource = webhttp.resource.Resource("/sub/", self.docroot)
+        etag = resource.generate_etag()
+        self.assertNotIn("new.txt", resource.get_content())
+
+        sub = os.path.join(self.root, "sub")
+        open(os.path.join(sub, "new.txt"), "w").close()
+        later = os.path.getmtime(resource.path) + 10
+        os.utime(sub, (later, later))
+        resource = webhttp.resource.Resource("/sub/", self.docroot)
+        self.assertIn("new.txt", resource.get_content())
+        self.assertNotEqual(resource.generate_etag(), etag)
+
+    def test_gzip_name(self):
+        """A directory named like the gzipped version of a file is listed"""
+        with open(os.path.join(self.root, "x"), "w") as f:
+            f.write("x")
+        os.mkdir(os.path.join(self.root, "x.gz"))
+        webhttp.resource.Resource("/x", self.docroot).encode_content("gzip")
+        resource = webhttp.resource.Resource("/x.gz/", self.docroot)
+        resource.encode_content("gzip")
+        self.assertEqual(resource.get_content_encoding(), "gzip")
+
+    def test_missing_directory(self):
+        """A directory which cannot be listed is forbidden"""
+        self.assertRaises(
+            webhttp.resource.FileAccessError,
+            self.docroot.render_index, os.path.join(self.root, "missing")
+        )
+
+
+class TestPrewarm(unittest.TestCase):
+    """Test cases for pre-warming and access statistics, these do not use
+    the server
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.root = os.path.join(self.directory, "root")
+        os.mkdir(self.root)
+        self.docroot = webhttp.resource.DocumentRoot(
+            self.root, os.path.join(self.directory, "encoded")
+        )
+
+    def tearDown(self):
+        """Clean up after testing"""
+        shutil.rmtree(self.directory)
+
+    def test_load_list(self):
+        """A list with URIs, optionally preceded by a host"""
+        vhosts = webhttp.vhost.VirtualHosts(self.root)
+        vhosts.add_host("example.com", self.root)
+        filename = os.path.join(self.directory, "list")
+        with open(filename, "w") as f:
+            f.write("/index.html\nexample.com:80 /a.txt\n\n/b.txt\n")
+        targets = dict(webhttp.prewarm.load_list(filename, vhosts))
+        self.assertEqual(targets[vhosts.default], ["/index.html", "/b.txt"])
+        self.assertEqual(targets[vhosts.hosts["example.com"]], ["/a.txt"])
+
+    def test_stats(self):
+        """Access statistics are loaded with the most requested URI first"""
+        self.docroot.record_hit("/a.txt")
+        self.docroot.record_hit("/b.txt?x=1")
+        self.docroot.record_hit("/b.txt")
+        self.docroot.save_stats()
+        self.assertEqual(self.docroot.load_stats(), ["/b.txt", "/a.txt"])
+
+    def test_no_stats(self):
+        """A document root without access statistics"""
+        self.assertEqual(self.docroot.load_stats(), [])
+
+    def test_reuse_roots(self):
+        """Unchanged document roots keep their caches after a reload"""
+        old = webhttp.vhost.VirtualHosts(self.root)
+        old.add_host("same", self.root)
+        old.add_host("changed", self.root)
+        new = webhttp.vhost.VirtualHosts(self.root)
+        new.add_host("same", self.root)
+        new.add_host("changed", self.root, True)
+        new.reuse_roots(old)
+        self.assertIs(new.default, old.default)
+        self.assertIs(new.hosts["same"], old.hosts["same"])
+        self.assertIsNot(new.hosts["changed"], old.hosts["changed"])
+
+    def test_budget(self):
+        """Walking a document root stops when the cache would be full and
+        skips files which are too large to be cached
+        """
+        for name in ["a", "b", "c"]:
+            with open(os.path.join(self.root, name), "w") as f:
+                f.write("x" * 40)
+        with open(os.path.join(self.root, "large"), "w") as f:
+            f.write("x" * 60)
+        cache = webhttp.resource.ContentCache(100, 50)
+        prewarmer = webhttp.prewarm.Prewarmer([(self.docroot, None)], cache)
+        uris = prewarmer.find_uris(self.docroot)
+        self.assertEqual(len(uris), 2)
+        self.assertNotIn("/large", uris)
+
+
+class TestProfiler(unittest.TestCase):
+    """Test cases for the sampling profiler, these do not use the server"""
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.stop = threading.Event()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        self.stop.set()
+        shutil.rmtree(self.directory)
+
+    def wait_for_stop(self):
+        """Function of the thread which is profiled"""
+        self.stop.wait()
+
+    def test_profile(self):
+        """The stacks of other threads are written in the collapsed stack
+        format
+        """
+        thread = threading.Thread(target=self.wait_for_stop)
+        thread.daemon = True
+        thread.start()
+        filename = os.path.join(self.directory, "profile.txt")
+        profiler = webhttp.profiler.SamplingProfiler(filename, 0.05)
+        profiler.start()
+        profiler.join()
+
+        with open(filename) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(int(count) > 0)
+        self.assertTrue(any(line.startswith("Thread;") and
+                            "wait_for_stop" in line for line in lines))
+
+
+class TestSettings(unittest.TestCase):
+    """Test cases for loading and reloading the settings, these do not use
+    the server
+    """
+
+    def setUp(self):
+        """Prepare for testing"""
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, "webserver.ini")
+        self.cache = webhttp.resource.ContentCache()
+
+    def tearDown(self):
+        """Clean up after testing"""
+        shutil.rmtree(self.directory)
+
+    def make_args(self, config=None, timeout=None, root=None, autoindex=None):
+        """Create command line options"""
+        return argparse.Namespace(config=config, timeout=timeout, root=root,
+                                  autoindex=autoindex, vhosts=None)
+
+    def write_config(self, content):
+        """Write the configuration file"""
+        with open(self.config, "w") as f:
+            f.write(content)
+
+    def test_defaults(self):
+        """Without configuration file or options the defaults are used"""
+        timeout, vhosts = webserver.load_settings(self.make_args(), self.cache)
+        self.assertEqual(timeout, 15)
+        self.assertEqual(vhosts.default.path, "content")
+        self.assertFalse(vhosts.default.autoindex)
+
+    def test_config(self):
+        """The configuration file overrides the defaults"""
+        self.write_config("[server]\ntimeout = 30\nautoindex = yes\n")
+        timeout, vhosts = webserver.load_settings(
+            self.make_args(self.config), self.cache
+        )
+        self.assertEqual(timeout, 30)
+        self.assertEqual(vhosts.default.path, "content")
+        self.assertTrue(vhosts.default.autoindex)
+
+    def test_options(self):
+        """Command line options override the configuration file"""
+        self.write_config("[server]\ntimeout = 30\nroot = other\n"
+                          "autoindex = no\n")
+        timeout, vhosts = webserver.load_settings(
+            self.make_args(self.config, 5, "content", True), self.cache
+        )
+        self.assertEqual(timeout, 5)
+        self.assertEqual(vhosts.default.path, "content")
+        self.assertTrue(vhosts.default.autoindex)
+
+    def test_invalid_reload(self):
+        """A reload with an invalid configuration keeps the old settings"""
+        server = webhttp.server.Server("localhost", 0, 15)
+        vhosts = server.vhosts
+        for content in ["[server]\ntimeout = abc\n",
+                        "[server]\nautoindex = maybe\n",
+                        "timeout = 5\n"]:
+            self.write_config(content)
+            self.assertFalse(webserver.reload_settings(
+                server, self.make_args(self.config), self.cache
+            ))
+            self.assertEqual(server.timeout, 15)
+            self.assertIs(server.vhosts, vhosts)
+
+        self.write_config("[server]\ntimeout = 5\n")
+        self.assertTrue(webserver.reload_settings(
+            server, self.make_args(self.config), self.cache
+        ))
+        self.assertEqual(server.timeout, 5)
+
+
 if __name__ == "__main__":
     # Parse command line arguments
-    import argparse
     parser = argparse.ArgumentParser(description="HTTP Tests")
     parser.add_argument("-p", "--port", type=int, default=8001)
+    parser.add_argument("--https-port", type=int, default=0)
+    parser.add_argument("--vhosts", action="store_true",
+                        help="server was started with vhosts.ini")
+    parser.add_argument("--allow-put", action="store_true",
+                        help="server was started with --allow-put")
+    parser.add_argument("--autoindex", action="store_true",
+                        help="server was started with --autoindex")
     
     # Arguments for the unittest framework
     parser.add_argument('unittest_args', nargs='*')
     args = parser.parse_args()
+    https_portnr = args.https_port
+    vhosts_enabled = args.vhosts
+    put_enabled = args.allow_put
+    autoindex_enabled = args.autoindex
     
     # Only pass the unittest arguments to unittest
     sys.argv[1:] = args.unittest_args